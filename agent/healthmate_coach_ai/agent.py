@@ -12,6 +12,7 @@ import httpx
 import json
 import base64
 import logging
+import time
 from datetime import datetime
 import pytz
 from strands import Agent, tool
@@ -212,14 +213,26 @@ async def _call_mcp_gateway(method: str, params: dict = None, access_token: str
         return result.get('result')
 
 
+# ツールリストのキャッシュ（有効期限, 整形済みツールリスト）
+# ツールのスキーマはユーザーに依存せず頻繁には変わらないため、短時間は再取得しない
+_TOOLS_LIST_CACHE_TTL = 60
+_tools_list_cache = None
+
+
 # HealthManagerMCP統合ツール
 @tool
 async def list_health_tools() -> str:
     """HealthManagerMCPで利用可能なツールのリストを取得（ページング対応）"""
+    global _tools_list_cache
+    if _tools_list_cache and time.monotonic() < _tools_list_cache[0]:
+        logger.debug("ツールリストをキャッシュから取得")
+        return _tools_list_cache[1]
+    
     try:
         all_tools = []
         cursor = None
         page_count = 0
+        paging_completed = False
         
         # nextCursorがnullになるまで全てのページを取得
         while True:
@@ -247,6 +260,7 @@ async def list_health_tools() -> str:
             next_cursor = result.get('nextCursor')
             if not next_cursor:
                 logger.debug("nextCursorがnull - ページング完了")
+                paging_completed = True
                 break
             
             cursor = next_cursor
@@ -281,7 +295,11 @@ async def list_health_tools() -> str:
             
             tool_descriptions.append(tool_info)
         
-        return f"利用可能なHealthManagerMCPツール ({len(all_tools)}個、{page_count}ページから取得):\n\n" + "\n".join(tool_descriptions)
+        tools_list = f"利用可能なHealthManagerMCPツール ({len(all_tools)}個、{page_count}ページから取得):\n\n" + "\n".join(tool_descriptions)
+        # 空応答・ページ数制限で途中終了した不完全なリストはキャッシュしない
+        if paging_completed:
+            _tools_list_cache = (time.monotonic() + _TOOLS_LIST_CACHE_TTL, tools_list)
+        return tools_list
         
     except Exception as e:
         logger.error(f"ツールリスト取得エラー: {e}")
@@ -318,6 +336,31 @@ async def health_manager_mcp(tool_name: str, arguments: dict) -> str:
         return f"HealthManagerMCP呼び出しエラー: {e}"
 
 
+# 長期メモリ戦略の検索設定（セッションに依存しないため起動時に一度だけ作成）
+_MEMORY_RETRIEVAL_CONFIG = {
+    "/healthmate/userpreferences/actors/{actorId}": RetrievalConfig(
+        top_k=5,
+        relevance_score=0.7
+    ),
+    "/healthmate/semantics/actors/{actorId}": RetrievalConfig(
+        top_k=10,
+        relevance_score=0.7
+    ),
+    "/healthmate/summaries/actors/{actorId}/sessions/": RetrievalConfig(
+        top_k=5,
+        relevance_score=0.6
+    ),
+    "/healthmate/episodes/actors/{actorId}/sessions/": RetrievalConfig(
+        top_k=5,
+        relevance_score=0.6
+    ),
+    "/healthmate/episodes/actors/{actorId}": RetrievalConfig(
+        top_k=3,
+        relevance_score=0.75
+    )
+}
+
+
 async def _create_health_coach_agent_with_memory(session_id: str, actor_id: str):
     """AgentCoreMemorySessionManagerを使用してHealthmate-CoachAIエージェントを作成（環境別対応）"""
     
@@ -347,28 +390,7 @@ async def _create_health_coach_agent_with_memory(session_id: str, actor_id: str)
         session_id=session_id,
         actor_id=actor_id,
         # 長期メモリ戦略
-        retrieval_config={ 
-            "/healthmate/userpreferences/actors/{actorId}": RetrievalConfig(
-                top_k=5,
-                relevance_score=0.7
-            ),
-            "/healthmate/semantics/actors/{actorId}": RetrievalConfig(
-                top_k=10,
-                relevance_score=0.7
-            ),
-            "/healthmate/summaries/actors/{actorId}/sessions/": RetrievalConfig(
-                top_k=5,
-                relevance_score=0.6
-            ),
-            "/healthmate/episodes/actors/{actorId}/sessions/": RetrievalConfig(
-                top_k=5,             
-                relevance_score=0.6  
-            ),
-            "/healthmate/episodes/actors/{actorId}": RetrievalConfig(
-                top_k=3,             
-                relevance_score=0.75 
-            )
-        }
+        retrieval_config=_MEMORY_RETRIEVAL_CONFIG
     )
     
     # AgentCoreMemorySessionManagerを作成
@@ -537,8 +559,8 @@ async def invoke(payload, context):
         yield {"event": {"contentBlockDelta": {"delta": {"text": "エラー: JWT トークンからユーザーIDを抽出できませんでした。"}}}}
         return
     
-    # デフォルトメッセージ
-    if not prompt:
+    # デフォルトメッセージ（空白のみのプロンプトもエージェントを起動せずに応答）
+    if not prompt or (isinstance(prompt, str) and not prompt.strip()):
         yield {"event": {"contentBlockDelta": {"delta": {"text": "こんにちは！健康に関してどのようなサポートが必要ですか？"}}}}
         return
     
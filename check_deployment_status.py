@@ -5,10 +5,13 @@ HealthCoachAI デプロイ状態確認スクリプト
 AWSにデプロイされたHealthCoachAIエージェントの状態を確認します。
 """
 
-import boto3
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from test_config_helper import test_config
+from test_config_helper import configure_logging, get_boto3_client, test_config
+
+logger = logging.getLogger('healthmate.check_deployment_status')
 
 
 def print_banner():
@@ -33,7 +36,7 @@ def check_agent_status():
     """エージェントの状態を確認"""
     try:
         config = test_config.get_all_config()
-        client = boto3.client('bedrock-agentcore', region_name=config['region'])
+        client = get_boto3_client('bedrock-agentcore', config['region'])
         
         print("🔍 エージェント一覧を取得中...")
         
@@ -69,9 +72,14 @@ def check_agent_status():
         
         agent_id = health_coach_agent['agentId']
         
-        # エージェントの詳細情報を取得
-        print("🔍 エージェント詳細情報を取得中...")
-        detail_response = client.get_agent(agentId=agent_id)
+        # エージェント詳細とエイリアス一覧は互いに独立しているため並行して取得
+        print("🔍 エージェント詳細情報・エイリアス一覧を取得中...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            detail_future = executor.submit(client.get_agent, agentId=agent_id)
+            alias_future = executor.submit(client.list_agent_aliases, agentId=agent_id)
+            detail_response = detail_future.result()
+            alias_response = alias_future.result()
+        
         agent_detail = detail_response.get('agent', {})
         
         print("📋 HealthCoachAI エージェント詳細:")
@@ -84,9 +92,7 @@ def check_agent_status():
         print(f"   更新日時: {format_datetime(agent_detail.get('updatedAt', 'Unknown'))}")
         print()
         
-        # エージェントエイリアス一覧を取得
-        print("🔍 エージェントエイリアス一覧を取得中...")
-        alias_response = client.list_agent_aliases(agentId=agent_id)
+        # エージェントエイリアス一覧
         aliases = alias_response.get('agentAliasSummaries', [])
         
         if not aliases:
@@ -122,8 +128,7 @@ def check_agent_status():
         
     except Exception as e:
         print(f"❌ エラーが発生しました: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("エージェント状態確認中に例外が発生しました")
         return False
 
 
@@ -140,11 +145,11 @@ def main():
 
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         main()
     except KeyboardInterrupt:
         print("\n\n👋 確認が中断されました。")
     except Exception as e:
         print(f"\n❌ 予期しないエラーが発生しました: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        logger.exception("予期しない例外が発生しました")
\ No newline at end of file
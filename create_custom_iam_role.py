@@ -7,10 +7,14 @@ AgentCore Runtime用の適切な権限を持つカスタムIAMロールを環境
 
 import boto3
 import json
+import logging
 import sys
 import time
 import os
 from botocore.exceptions import ClientError
+from test_config_helper import configure_logging
+
+logger = logging.getLogger('healthmate.create_custom_iam_role')
 
 
 def get_environment_config():
@@ -145,10 +149,10 @@ def create_iam_role_and_policies():
         
     except Exception as e:
         print(f"❌ IAMロール作成エラー: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("IAMロール作成中に例外が発生しました")
         sys.exit(1)
 
 
 if __name__ == "__main__":
+    configure_logging()
     create_iam_role_and_policies()
\ No newline at end of file
@@ -12,28 +12,63 @@ JWT IDトークンを使用してboto3 bedrock-agentcoreクライアントで直
 - 環境別設定ファイルの読み込み
 """
 
+import argparse
 import asyncio
-import uuid
-import boto3
-import hashlib
+import atexit
+import secrets
+import signal
 import hmac
 import base64
+import io
 import json
 import sys
 import readline
 import tempfile
+import threading
+import traceback
 import os
-import yaml
 import requests
 import urllib.parse
-from botocore.exceptions import ClientError
-from test_config_helper import test_config
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from test_config_helper import configure_logging, get_boto3_client, test_config
+
+# input()毎の自動履歴追加を無効化（履歴は対話入力ループでのみ明示的に追加）
+readline.set_auto_history(False)
+
+# orjsonが利用可能な場合はCで実装された高速なJSONデコーダーを使用（bytesを直接デコード）
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+def load_yaml(path: str) -> dict:
+    """YAMLファイルを読み込む（libyamlが利用可能な場合はCローダーで高速に読み込む）"""
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    
+    # ファイル全体を文字列で渡し、Cローダーがストリーム経由の読み込みを行わないようにする
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f.read(), Loader=loader)
 
 # ========================================
 # 環境設定
 # ========================================
 
-def get_environment_config():
+@dataclass(frozen=True, slots=True)
+class EnvironmentConfig:
+    """環境設定（実行中に変更されないため読み取り専用）"""
+    environment: str
+    env_suffix: str
+    agent_name: str
+
+
+def get_environment_config() -> EnvironmentConfig:
     """環境設定を取得"""
     # HEALTHMATE_ENV環境変数の取得（デフォルト: dev）
     environment = os.environ.get('HEALTHMATE_ENV', 'dev')
@@ -52,11 +87,11 @@ def get_environment_config():
     agent_name = "healthmate_coach_ai"
     agent_name = f"{agent_name}_{environment}"
     
-    return {
-        'environment': environment,
-        'env_suffix': env_suffix,
-        'agent_name': agent_name
-    }
+    return EnvironmentConfig(
+        environment=environment,
+        env_suffix=env_suffix,
+        agent_name=agent_name
+    )
 
 # 環境設定を取得
 ENV_CONFIG = get_environment_config()
@@ -75,39 +110,107 @@ TEST_TIMEZONE = 'Asia/Tokyo'
 TEST_LANGUAGE = 'ja'
 #TEST_LANGUAGE = 'en'
 
+# ストリーミング表示のフラッシュ間隔（チャンク数）
+# 改行・句点を含むチャンクでは間隔に関係なくフラッシュします
+STREAM_FLUSH_INTERVAL = 16
+
+# テストユーザー名のプレフィックス
+TEST_USERNAME_PREFIX = 'deployed_test_'
+
+# 強制終了などで削除されずに残ったテストユーザーを、--sweep-stale-users 指定時に削除する経過時間（秒）
+# 実行中の他セッションのユーザーを消さないよう、セッションの想定利用時間より十分長くする
+STALE_TEST_USER_AGE = 24 * 3600
+
+# 終了時に残存テストユーザー削除の完了を待つ最大時間（秒、超えた場合は待たずに終了）
+STALE_TEST_USER_SWEEP_TIMEOUT = 5
+
+# 予期しないエラーのスタックトレースを表示する場合は HEALTHMATE_DEBUG=1 を設定
+DEBUG = bool(os.environ.get('HEALTHMATE_DEBUG'))
+
 # ========================================
 
 
+# SSEのデータ行プレフィックス（0x64 == ord('d')）
+_SSE_DATA_PREFIX = b'data: '
+
+
+def parse_sse_text(line: bytes) -> Optional[str]:
+    """SSEの1行（デコード前のbytes）からcontentBlockDeltaのテキストを抽出（テキストがない行はNoneを返す）"""
+    # 空行・data以外の行は先頭バイトの比較で早期に除外
+    if not line or line[0] != 0x64 or not line.startswith(_SSE_DATA_PREFIX):
+        return None
+    
+    data_json = line[len(_SSE_DATA_PREFIX):]
+    if not data_json.strip():
+        return None
+    
+    try:
+        event_data = json_loads(data_json)
+    except ValueError:  # json.JSONDecodeError / orjson.JSONDecodeError
+        return None
+    
+    # contentBlockDelta イベントからテキストを抽出（想定外の形のイベントは各階層の型確認で除外）
+    for key in ('event', 'contentBlockDelta', 'delta'):
+        if not isinstance(event_data, dict):
+            return None
+        event_data = event_data.get(key)
+    if not isinstance(event_data, dict):
+        return None
+    
+    text = event_data.get('text')
+    return text if isinstance(text, str) else None
+
+
 class DeployedAgentTestSession:
     """デプロイ済みエージェント手動テスト用セッションクラス"""
     
     def __init__(self):
         """セッション初期化"""
         self.config = test_config.get_all_config()
-        self.cognito_client = boto3.client('cognito-idp', region_name=self.config['region'])
-        self.agentcore_client = boto3.client('bedrock-agentcore', region_name=self.config['region'])
+        self.cognito_client = get_boto3_client('cognito-idp', self.config['region'])
+        self.agentcore_client = get_boto3_client('bedrock-agentcore', self.config['region'])
         self.test_username = None
         self.jwt_token = None
+        self._jwt_payload = None
         self.session_active = False
         self.conversation_count = 0
         self.jwt_token_file = None
         self.agent_runtime_arn = None
+        self._runtime_endpoint_url = None
+        self._payload_template = None
+        self._base_headers = None
+        
+        # AgentCore Runtime呼び出し用HTTPセッション（会話ターン間でTCP/TLS接続を再利用）
+        # 呼び出しはPOST（非冪等）のため、再試行はリクエスト送信前の接続エラーのみとする
+        # （読み取りエラーやステータスコードによる再試行では同じプロンプトが二重に処理されうる）
+        self.http = requests.Session()
+        self.http.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, connect=2, read=0, status=0)
+        ))
+        
+        # Secret Hash計算用のキーとClient IDを事前にバイト列化（Client Secretがない場合はNone）
+        client_secret = self.config.get('client_secret')
+        self._secret_hash_key = client_secret.encode('utf-8') if client_secret else None
+        self._client_id_bytes = self.config['client_id'].encode('utf-8')
     
     def calculate_secret_hash(self, username: str) -> str:
         """Cognito Client Secret Hash を計算（Client Secret不要の場合はNoneを返す）"""
         # Client Secretが設定されていない場合はNoneを返す
-        if not hasattr(self.config, 'client_secret') or not self.config.get('client_secret'):
+        if not self._secret_hash_key:
             return None
         
-        message = username + self.config['client_id']
-        dig = hmac.new(
-            self.config['client_secret'].encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
+        return self._compute_secret_hash(self._secret_hash_key, self._client_id_bytes, username)
+    
+    @staticmethod
+    def _compute_secret_hash(secret_key: bytes, client_id: bytes, username: str) -> str:
+        """Secret Hash（HMAC-SHA256）を計算"""
+        dig = hmac.digest(secret_key, username.encode('utf-8') + client_id, 'sha256')
         return base64.b64encode(dig).decode()
     
-    def _decode_jwt_payload(self, jwt_token: str) -> dict:
+    @staticmethod
+    def _decode_jwt_payload(jwt_token: str) -> dict:
         """JWTトークンのペイロードをデコード（署名検証なし）"""
         try:
             parts = jwt_token.split('.')
@@ -115,11 +218,7 @@ class DeployedAgentTestSession:
                 raise ValueError("Invalid JWT format")
             
             payload = parts[1]
-            padding = 4 - (len(payload) % 4)
-            if padding != 4:
-                payload += '=' * padding
-            
-            decoded_bytes = base64.urlsafe_b64decode(payload)
+            decoded_bytes = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
             payload_data = json.loads(decoded_bytes.decode('utf-8'))
             
             return payload_data
@@ -128,18 +227,21 @@ class DeployedAgentTestSession:
             print(f"JWT デコードエラー: {e}")
             return {}
     
+    def _get_jwt_payload(self) -> dict:
+        """現在のJWTトークンのデコード済みペイロードを取得（認証時にデコードしたものを再利用）"""
+        return self._jwt_payload or {}
+    
     def _load_agent_runtime_arn(self):
         """AgentCore設定ファイルからAgent Runtime ARNを取得（環境別対応）"""
         try:
             config_file = '.bedrock_agentcore.yaml'
-            if not os.path.exists(config_file):
+            try:
+                agentcore_config = load_yaml(config_file)
+            except FileNotFoundError:
                 raise FileNotFoundError(f"AgentCore設定ファイル '{config_file}' が見つかりません")
             
-            with open(config_file, 'r', encoding='utf-8') as f:
-                agentcore_config = yaml.safe_load(f)
-            
             # 環境別エージェント名でARNを取得
-            agent_name = ENV_CONFIG['agent_name']
+            agent_name = ENV_CONFIG.agent_name
             agents = agentcore_config.get('agents', {})
             agent_config = agents.get(agent_name, {})
             bedrock_agentcore = agent_config.get('bedrock_agentcore', {})
@@ -153,8 +255,14 @@ class DeployedAgentTestSession:
                                f"利用可能なエージェント: {available_agents}")
             
             self.agent_runtime_arn = agent_arn
+            
+            # JWT認証の場合、AWS SDKは使用できないため、直接HTTPSリクエストを送信する
+            # AgentCore Runtime エンドポイントURLを事前に構築（AWS公式ドキュメント準拠）
+            escaped_agent_arn = urllib.parse.quote(agent_arn, safe='')
+            self._runtime_endpoint_url = f"https://bedrock-agentcore.{self.config['region']}.amazonaws.com/runtimes/{escaped_agent_arn}/invocations?qualifier=DEFAULT"
+            
             print(f"   ✅ Agent Runtime ARN: {agent_arn}")
-            print(f"   🌍 環境: {ENV_CONFIG['environment']}")
+            print(f"   🌍 環境: {ENV_CONFIG.environment}")
             print(f"   🤖 エージェント名: {agent_name}")
             return True
             
@@ -172,8 +280,8 @@ class DeployedAgentTestSession:
                 return False
             
             # Agent Runtime ARNが取得できれば、エージェントは利用可能と判断
-            print(f"   ✅ {ENV_CONFIG['agent_name']} エージェントのRuntime ARNが確認できました")
-            print(f"   🌍 テスト環境: {ENV_CONFIG['environment']}")
+            print(f"   ✅ {ENV_CONFIG.agent_name} エージェントのRuntime ARNが確認できました")
+            print(f"   🌍 テスト環境: {ENV_CONFIG.environment}")
             return True
             
         except Exception as e:
@@ -182,17 +290,20 @@ class DeployedAgentTestSession:
     
     async def setup_authentication(self):
         """認証セットアップ"""
+        from botocore.exceptions import ClientError
+        
         print("🔐 認証セットアップ中...")
         
         # ランダムなテストユーザー名を生成
-        self.test_username = f"deployed_test_{uuid.uuid4().hex[:8]}"
+        self.test_username = f"{TEST_USERNAME_PREFIX}{secrets.token_hex(4)}"
         test_password = "DeployedTest123!"
         test_email = f"{self.test_username}@example.com"
         
         try:
             # テストユーザー作成
             print(f"   ユーザー作成: {self.test_username}")
-            self.cognito_client.admin_create_user(
+            await asyncio.to_thread(
+                self.cognito_client.admin_create_user,
                 UserPoolId=self.config['user_pool_id'],
                 Username=self.test_username,
                 UserAttributes=[
@@ -204,7 +315,8 @@ class DeployedAgentTestSession:
             )
             
             # パスワードを永続化
-            self.cognito_client.admin_set_user_password(
+            await asyncio.to_thread(
+                self.cognito_client.admin_set_user_password,
                 UserPoolId=self.config['user_pool_id'],
                 Username=self.test_username,
                 Password=test_password,
@@ -226,7 +338,8 @@ class DeployedAgentTestSession:
             
             # まずADMIN_NO_SRP_AUTHを試行
             try:
-                response = self.cognito_client.admin_initiate_auth(
+                response = await asyncio.to_thread(
+                    self.cognito_client.admin_initiate_auth,
                     UserPoolId=self.config['user_pool_id'],
                     ClientId=self.config['client_id'],
                     AuthFlow='ADMIN_NO_SRP_AUTH',
@@ -236,7 +349,8 @@ class DeployedAgentTestSession:
                 if 'Auth flow not enabled' in str(e):
                     print("   ⚠️  ADMIN_NO_SRP_AUTH フローが無効です。ALLOW_USER_PASSWORD_AUTH を試行します...")
                     # ALLOW_USER_PASSWORD_AUTHフローを試行
-                    response = self.cognito_client.initiate_auth(
+                    response = await asyncio.to_thread(
+                        self.cognito_client.initiate_auth,
                         ClientId=self.config['client_id'],
                         AuthFlow='USER_PASSWORD_AUTH',
                         AuthParameters=auth_parameters
@@ -245,15 +359,26 @@ class DeployedAgentTestSession:
                     raise
             
             self.jwt_token = response['AuthenticationResult']['AccessToken']  # AccessTokenを使用
+            self._jwt_payload = self._decode_jwt_payload(self.jwt_token)
             self.session_active = True
             
+            # セッション中は変わらないペイロード項目・ヘッダーを事前に構築
+            self._payload_template = {
+                "timezone": TEST_TIMEZONE,
+                "language": TEST_LANGUAGE
+            }
+            self._base_headers = {
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.jwt_token}'
+            }
+            
             # JWTトークンを一時ファイルに保存
             with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.jwt') as f:
                 f.write(self.jwt_token)
                 self.jwt_token_file = f.name
             
             # JWTトークンからユーザーIDを取得して表示
-            payload = self._decode_jwt_payload(self.jwt_token)
+            payload = self._get_jwt_payload()
             user_id = payload.get('sub')
             client_id = payload.get('aud')
             
@@ -274,11 +399,82 @@ class DeployedAgentTestSession:
             print(f"   ❌ 認証セットアップエラー: {e}")
             return False
     
+    def remove_jwt_token_file(self):
+        """JWTトークンの一時ファイルを削除（プロセス終了時にも呼び出される）"""
+        if self.jwt_token_file:
+            try:
+                os.unlink(self.jwt_token_file)
+                print(f"   ✅ JWTトークンファイル削除: {self.jwt_token_file}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"   ⚠️  JWTトークンファイル削除エラー: {e}")
+        self.jwt_token_file = None
+    
+    def _delete_test_user(self, username: str) -> bool:
+        """テストユーザーを削除（失敗してもエラーにしない）"""
+        try:
+            self.cognito_client.admin_delete_user(
+                UserPoolId=self.config['user_pool_id'],
+                Username=username
+            )
+            return True
+        except Exception:
+            return False
+    
+    def sweep_stale_test_users(self) -> int:
+        """以前の実行で削除されずに残ったテストユーザーを削除
+        
+        作成からSTALE_TEST_USER_AGE秒以上経過したテストユーザーが対象です。
+        他プロセスで実行中のセッションでも、この時間を超えていればユーザーは削除されます。
+        
+        Returns:
+            削除したユーザー数
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=STALE_TEST_USER_AGE)
+        paginator = self.cognito_client.get_paginator('list_users')
+        stale_usernames = [
+            user['Username']
+            for page in paginator.paginate(
+                UserPoolId=self.config['user_pool_id'],
+                Filter=f'username ^= "{TEST_USERNAME_PREFIX}"'
+            )
+            for user in page['Users']
+            if user['UserCreateDate'] < cutoff
+        ]
+        if not stale_usernames:
+            return 0
+        
+        # デーモンスレッドから呼ばれるため、終了時に待ち合わせが発生するスレッドプールは使わない
+        return sum(self._delete_test_user(username) for username in stale_usernames)
+    
+    def start_stale_test_user_sweep(self) -> Future:
+        """残存テストユーザーの削除をデーモンスレッドで即座に開始
+        
+        デーモンスレッドのため、完了していなくてもプログラムの終了を妨げません。
+        ThreadPoolExecutor（asyncio.to_threadが使うデフォルトエグゼキューターを含む）の
+        ワーカーはインタープリター終了時・asyncio.run()の終了時に完了を待ち合わせるため、
+        削除が長引いた場合に終了までの時間を制限できません。そのため、Futureを自前で用意して
+        デーモンスレッドから結果を設定します。
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        
+        def run():
+            try:
+                future.set_result(self.sweep_stale_test_users())
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, name='stale-test-user-sweep', daemon=True).start()
+        return future
+    
     async def cleanup_session(self):
         """セッションクリーンアップ"""
         if self.test_username:
             try:
-                self.cognito_client.admin_delete_user(
+                await asyncio.to_thread(
+                    self.cognito_client.admin_delete_user,
                     UserPoolId=self.config['user_pool_id'],
                     Username=self.test_username
                 )
@@ -287,18 +483,15 @@ class DeployedAgentTestSession:
                 print(f"   ⚠️  ユーザー削除エラー: {e}")
         
         # JWTトークンファイルを削除
-        if self.jwt_token_file and os.path.exists(self.jwt_token_file):
-            try:
-                os.remove(self.jwt_token_file)
-                print(f"   ✅ JWTトークンファイル削除: {self.jwt_token_file}")
-            except Exception as e:
-                print(f"   ⚠️  JWTトークンファイル削除エラー: {e}")
+        self.remove_jwt_token_file()
         
         self.session_active = False
         self.jwt_token = None
+        self._jwt_payload = None
         self.test_username = None
         self.conversation_count = 0
-        self.jwt_token_file = None
+        self._payload_template = None
+        self._base_headers = None
     
 
     async def test_agent_query_streaming(self, query: str, session_id: str = None):
@@ -312,70 +505,64 @@ class DeployedAgentTestSession:
             
             # セッションIDが指定されていない場合は生成
             if not session_id:
-                session_id = f'healthmate-test-session-{uuid.uuid4().hex}'
+                session_id = f'healthmate-test-session-{secrets.token_hex(16)}'
             
             print(f"🔗 使用セッションID: {session_id}")
             
-            # JWTトークン、タイムゾーン、言語をペイロードに含める
-            payload = {
-                "prompt": query,
-                "timezone": TEST_TIMEZONE,
-                "language": TEST_LANGUAGE
-            }
+            # タイムゾーン、言語（事前構築済み）にプロンプトを追加
+            payload = {**self._payload_template, "prompt": query}
             
 
             print("\n💬 Healthmate-CoachAI (Deployed) の回答:")
             print("-" * 60)
             
-            # JWT認証の場合、AWS SDKは使用できないため、直接HTTPSリクエストを送信
-            # AgentCore Runtime エンドポイントURLを構築（AWS公式ドキュメント準拠）
-            escaped_agent_arn = urllib.parse.quote(self.agent_runtime_arn, safe='')
-            runtime_endpoint_url = f"https://bedrock-agentcore.{self.config['region']}.amazonaws.com/runtimes/{escaped_agent_arn}/invocations?qualifier=DEFAULT"
-            
-            print(f"🔗 エンドポイント URL: {runtime_endpoint_url}")  # デバッグ用
+            print(f"🔗 エンドポイント URL: {self._runtime_endpoint_url}")  # デバッグ用
             
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {self.jwt_token}',
-                'X-Amzn-Bedrock-AgentCore-Runtime-Session-Id': session_id
-            }
+            # 事前構築済みヘッダーにセッションIDを追加
+            headers = {**self._base_headers, 'X-Amzn-Bedrock-AgentCore-Runtime-Session-Id': session_id}
             
-            import requests
-            response = requests.post(
-                runtime_endpoint_url,
+            # 接続確立〜レスポンスヘッダー受信まではワーカースレッドで待機
+            response = await asyncio.to_thread(
+                self.http.post,
+                self._runtime_endpoint_url,
                 headers=headers,
                 json=payload,
-                stream=True
+                stream=True,
+                timeout=(5, 300)
             )
             
             # ストリーミングレスポンスを処理
-            response_text = ""
+            response_chunks = []
+            write = sys.stdout.write
+            flush = sys.stdout.flush
+            pending_chunks = 0
             
             try:
                 response.raise_for_status()  # HTTPエラーをチェック
                 
                 # ストリーミングレスポンスを逐次処理
-                for line in response.iter_lines(decode_unicode=True):
-                    if line and line.startswith('data: '):
-                        try:
-                            data_json = line[6:]  # "data: " を除去
-                            if data_json.strip():
-                                event_data = json.loads(data_json)
-                                
-                                # contentBlockDelta イベントからテキストを抽出
-                                if 'event' in event_data and 'contentBlockDelta' in event_data['event']:
-                                    delta = event_data['event']['contentBlockDelta'].get('delta', {})
-                                    if 'text' in delta:
-                                        text_chunk = delta['text']
-                                        print(text_chunk, end='', flush=True)
-                                        response_text += text_chunk
-                        except json.JSONDecodeError:
-                            continue
+                # 行はbytesのまま扱い、JSONデコード時にのみUTF-8として解釈する
+                for line in response.iter_lines(chunk_size=8192):
+                    text_chunk = parse_sse_text(line)
+                    if text_chunk is None:
+                        continue
+                    
+                    write(text_chunk)
+                    response_chunks.append(text_chunk)
+                    
+                    # チャンク毎ではなく、改行・句点または一定チャンク数毎にフラッシュ
+                    pending_chunks += 1
+                    if pending_chunks >= STREAM_FLUSH_INTERVAL or '\n' in text_chunk or '。' in text_chunk:
+                        flush()
+                        pending_chunks = 0
                 
-                if not response_text:
+                flush()
+                
+                if not response_chunks:
                     print("⚠️  エージェントからの応答を取得できませんでした。")
                     
             except KeyboardInterrupt:
+                flush()
                 print("\n\n⚠️  ユーザーによって中断されました。")
             except requests.exceptions.RequestException as e:
                 print(f"❌ HTTPリクエストエラー: {e}")
@@ -385,37 +572,47 @@ class DeployedAgentTestSession:
             print()  # 改行
             print("-" * 60)
             
-            if not response_text:
+            if not response_chunks:
                 print("⚠️  エージェントからの応答を取得できませんでした。")
         
+        except requests.exceptions.Timeout as e:
+            print(f"❌ エージェント呼び出しタイムアウト: {e}")
+        except requests.exceptions.ConnectionError as e:
+            print(f"❌ エージェントへの接続エラー: {e}")
         except Exception as e:
             print(f"❌ デプロイ済みエージェント呼び出しエラー: {e}")
-            import traceback
-            traceback.print_exc()
+            if DEBUG:
+                traceback.print_exc()
     
 
+# バナー・ヘルプの表示内容（環境設定はプロセス中に変わらないため起動時に一度だけ構築）
+_BANNER = "\n".join([
+    "=" * 80,
+    "🚀 HealthCoachAI デプロイ済みエージェント手動テストプログラム（環境別設定対応）",
+    "=" * 80,
+    "",
+    "このプログラムでは、AWSにデプロイされたHealthCoachAIエージェントを",
+    "手動でテストできます。JWTトークンは自動生成され、",
+    "boto3 bedrock-agentcore クライアントで直接AgentCore Runtime環境と連携します。",
+    "🔗 boto3統合により、安定したエージェント呼び出しを実現します。",
+    "",
+    "🌍 環境設定:",
+    f"   環境: {ENV_CONFIG.environment}",
+    f"   エージェント名: {ENV_CONFIG.agent_name}",
+    f"   タイムゾーン: {TEST_TIMEZONE}",
+    f"   言語: {TEST_LANGUAGE}",
+    "",
+    "💡 環境切り替え方法:",
+    "   export HEALTHMATE_ENV=dev && python3 manual_test_deployed_agent.py",
+    "   export HEALTHMATE_ENV=stage && python3 manual_test_deployed_agent.py",
+    "   export HEALTHMATE_ENV=prod && python3 manual_test_deployed_agent.py",
+    "",
+]) + "\n"
+
+
 def print_banner():
     """バナー表示（環境別対応）"""
-    print("=" * 80)
-    print("🚀 HealthCoachAI デプロイ済みエージェント手動テストプログラム（環境別設定対応）")
-    print("=" * 80)
-    print()
-    print("このプログラムでは、AWSにデプロイされたHealthCoachAIエージェントを")
-    print("手動でテストできます。JWTトークンは自動生成され、")
-    print("boto3 bedrock-agentcore クライアントで直接AgentCore Runtime環境と連携します。")
-    print("🔗 boto3統合により、安定したエージェント呼び出しを実現します。")
-    print()
-    print(f"🌍 環境設定:")
-    print(f"   環境: {ENV_CONFIG['environment']}")
-    print(f"   エージェント名: {ENV_CONFIG['agent_name']}")
-    print(f"   タイムゾーン: {TEST_TIMEZONE}")
-    print(f"   言語: {TEST_LANGUAGE}")
-    print()
-    print(f"💡 環境切り替え方法:")
-    print(f"   export HEALTHMATE_ENV=dev && python3 manual_test_deployed_agent.py")
-    print(f"   export HEALTHMATE_ENV=stage && python3 manual_test_deployed_agent.py")
-    print(f"   export HEALTHMATE_ENV=prod && python3 manual_test_deployed_agent.py")
-    print()
+    sys.stdout.write(_BANNER)
 
 
 def get_multiline_input(prompt: str) -> str:
@@ -425,7 +622,7 @@ def get_multiline_input(prompt: str) -> str:
     print("   単一行の場合は、そのままEnterを押してください。")
     print()
     
-    lines = []
+    buffer = io.StringIO()
     line_count = 0
     
     try:
@@ -447,21 +644,23 @@ def get_multiline_input(prompt: str) -> str:
                 if line_count > 1 and not line.strip():
                     break
                 
-                # 行を追加
-                lines.append(line)
+                # 行を追加（対話入力の行のみ履歴に残す）
+                buffer.write(line)
+                buffer.write('\n')
+                readline.add_history(line)
                 
                 # 最初の行の場合、続けて入力するか確認
                 if line_count == 1:
                     print("   (続けて入力する場合はそのまま入力、完了の場合は空行でEnter)")
                 
             except (EOFError, KeyboardInterrupt):
-                if lines:
+                if buffer.tell():
                     print("\n入力がキャンセルされました。")
                     return ""
                 else:
                     raise
         
-        result = '\n'.join(lines).strip()
+        result = buffer.getvalue().strip()
         print()  # 空行を追加
         return result
         
@@ -469,59 +668,79 @@ def get_multiline_input(prompt: str) -> str:
         raise
 
 
+_HELP = "\n".join([
+    "\n📋 利用可能なコマンド:",
+    "  help     - このヘルプを表示",
+    "  quit     - プログラムを終了",
+    "  exit     - プログラムを終了",
+    "  clear    - 画面をクリア",
+    "  status   - セッション状態とユーザーIDを表示",
+    "  restart  - 認証を再実行",
+    "  memory_test - セッション継続性の自動テストを実行",
+    "",
+    "⌨️  入力方法:",
+    "  単一行入力 - テキスト入力後、Enterで実行",
+    "  複数行入力 - 各行でEnterを押して継続、空行で実行",
+    "  Ctrl + C   - 入力をキャンセル",
+    "",
+    "💡 テスト例:",
+    "  こんにちは",
+    "  利用可能なツールを教えてください",
+    "  私の健康データを確認してください",
+    "  新規ユーザーを作成してください",
+    "  健康目標を設定したいです",
+    "",
+    "🔗 セッション管理テスト例:",
+    "  1. 私の名前はジョニーです",
+    "  2. 私の名前を覚えていますか？",
+    "  (同じセッションIDで会話の継続性をテスト)",
+    "",
+    "🚀 デプロイ環境:",
+    "  このプログラムはAWSにデプロイされたエージェントをテストします",
+    "  AgentCore Runtime環境で実際に動作するエージェントと通信します",
+    "  � boルto3 bedrock-agentcore クライアント統合 - 安定したAPI呼び出し",
+    "",
+    "📊 DynamoDB確認:",
+    "  'status' コマンドでユーザーID (sub) を確認できます",
+    "  このIDでDynamoDBテーブル内のデータを検索してください",
+    "",
+]) + "\n"
+
+
 def print_help():
     """ヘルプ表示"""
-    print("\n📋 利用可能なコマンド:")
-    print("  help     - このヘルプを表示")
-    print("  quit     - プログラムを終了")
-    print("  exit     - プログラムを終了")
-    print("  clear    - 画面をクリア")
-    print("  status   - セッション状態とユーザーIDを表示")
-    print("  restart  - 認証を再実行")
-    print("  memory_test - セッション継続性の自動テストを実行")
-    print()
-    print("⌨️  入力方法:")
-    print("  単一行入力 - テキスト入力後、Enterで実行")
-    print("  複数行入力 - 各行でEnterを押して継続、空行で実行")
-    print("  Ctrl + C   - 入力をキャンセル")
-    print()
-    print("💡 テスト例:")
-    print("  こんにちは")
-    print("  利用可能なツールを教えてください")
-    print("  私の健康データを確認してください")
-    print("  新規ユーザーを作成してください")
-    print("  健康目標を設定したいです")
-    print()
-    print("🔗 セッション管理テスト例:")
-    print("  1. 私の名前はジョニーです")
-    print("  2. 私の名前を覚えていますか？")
-    print("  (同じセッションIDで会話の継続性をテスト)")
-    print()
-    print("🚀 デプロイ環境:")
-    print("  このプログラムはAWSにデプロイされたエージェントをテストします")
-    print("  AgentCore Runtime環境で実際に動作するエージェントと通信します")
-    print("  � boルto3 bedrock-agentcore クライアント統合 - 安定したAPI呼び出し")
-    print()
-    print("📊 DynamoDB確認:")
-    print("  'status' コマンドでユーザーID (sub) を確認できます")
-    print("  このIDでDynamoDBテーブル内のデータを検索してください")
-    print()
+    sys.stdout.write(_HELP)
 
 
-async def main():
-    """メイン関数"""
+def _exit_on_signal(signum, frame):
+    """シグナル受信時にSystemExitを送出"""
+    raise SystemExit(128 + signum)
+
+
+async def main(sweep_stale_users: bool = False):
+    """メイン関数
+    
+    Args:
+        sweep_stale_users: 以前の実行で残ったテストユーザーを削除するかどうか（prod環境では常に削除しない）
+    """
     print_banner()
     
     # セッション初期化
     session = DeployedAgentTestSession()
     
+    # SIGTERMでもfinallyのクリーンアップが実行されるようSystemExitに変換
+    # （入力待ち中はイベントループが停止しているため、loop.add_signal_handlerは使用しない）
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    # クリーンアップを経由せずに終了した場合もJWTトークンファイルを残さない
+    atexit.register(session.remove_jwt_token_file)
+    
     # エージェント状態を確認
     print("🔍 デプロイされたエージェント状態を確認中...")
     agent_status_success = await session.check_agent_status()
     
     if not agent_status_success:
         print("❌ エージェント状態の確認に失敗しました。")
-        print(f"   {ENV_CONFIG['agent_name']} エージェント（環境: {ENV_CONFIG['environment']}）がAWSにデプロイされていることを確認してください。")
+        print(f"   {ENV_CONFIG.agent_name} エージェント（環境: {ENV_CONFIG.environment}）がAWSにデプロイされていることを確認してください。")
         return
     
     # 初回認証
@@ -539,8 +758,18 @@ async def main():
     print("   ⌨️  複数行入力可能（空行で実行）")
     print()
     
+    # 以前の実行で残ったテストユーザーの削除は、指定時のみ対話と並行してバックグラウンドで実行
+    # （入力待ちでイベントループが止まっても進むよう、タスクではなくスレッドで即座に開始）
+    sweep_future = None
+    if sweep_stale_users:
+        if ENV_CONFIG.environment == 'prod':
+            print("⏭️  prod環境のため、残存テストユーザーの削除は行いません")
+            print()
+        else:
+            sweep_future = session.start_stale_test_user_sweep()
+    
     # セッション管理テスト用のセッションID
-    test_session_id = f'healthmate-test-session-{uuid.uuid4().hex}'
+    test_session_id = f'healthmate-test-session-{secrets.token_hex(16)}'
     print(f"🔗 テスト用セッションID: {test_session_id}")
     print("   このセッションIDで会話の継続性をテストします")
     print()
@@ -583,7 +812,7 @@ async def main():
                 
                 # 現在のユーザーIDを表示
                 if session.jwt_token:
-                    payload = session._decode_jwt_payload(session.jwt_token)
+                    payload = session._get_jwt_payload()
                     user_id = payload.get('sub')
                     print(f"   🔑 現在のユーザーID (sub): {user_id}")
                     print(f"   📊 DynamoDB確認用: {user_id}")
@@ -612,15 +841,35 @@ async def main():
         # セッションクリーンアップ
         print("\n🧹 セッションクリーンアップ中...")
         await session.cleanup_session()
+        if sweep_future is not None:
+            try:
+                swept_count = await asyncio.to_thread(sweep_future.result, STALE_TEST_USER_SWEEP_TIMEOUT)
+                if swept_count:
+                    print(f"   ✅ 残存テストユーザー削除: {swept_count}件")
+            except FutureTimeoutError:
+                print("   ⏭️  残存テストユーザー削除が完了していないため、待たずに終了します")
+            except Exception as e:
+                print(f"   ⚠️  残存テストユーザー削除エラー: {e}")
+        session.http.close()
         print("✅ クリーンアップ完了")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HealthCoachAI デプロイ済みエージェント手動テストプログラム")
+    parser.add_argument('--no-cache', action='store_true',
+                        help='CloudFormation設定のディスクキャッシュを使用せずに再取得する')
+    parser.add_argument('--sweep-stale-users', action='store_true',
+                        help='以前の実行で削除されずに残ったテストユーザー（24時間以上経過）を削除する（prod環境では無効）')
+    args = parser.parse_args()
+    configure_logging()
+    if args.no_cache:
+        test_config.use_disk_cache = False
+    
     try:
-        asyncio.run(main())
+        asyncio.run(main(sweep_stale_users=args.sweep_stale_users))
     except KeyboardInterrupt:
         print("\n\n👋 プログラムが中断されました。")
     except Exception as e:
         print(f"\n❌ 予期しないエラーが発生しました: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        if DEBUG:
+            traceback.print_exc()
\ No newline at end of file
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+CoachAI エントリーポイントのユニットテスト
+
+空白のみのプロンプトに対して、エージェント（Bedrock）を起動せずに
+デフォルトメッセージを返すことを確認します。
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# エージェントパッケージをPythonパスに追加
+sys.path.insert(0, str(Path(__file__).parent / "agent"))
+
+# エージェントモジュールのインポート時に必須となる環境変数（テスト用のダミー値）
+os.environ.setdefault('AGENTCORE_PROVIDER_NAME', 'test-provider')
+os.environ.setdefault('HEALTHMANAGER_GATEWAY_ID', 'test-gateway')
+
+pytest.importorskip("strands")
+pytest.importorskip("bedrock_agentcore")
+agent_module = pytest.importorskip("healthmate_coach_ai.agent")
+
+DEFAULT_GREETING = "こんにちは！健康に関してどのようなサポートが必要ですか？"
+
+
+def _make_jwt(payload: dict) -> str:
+    """署名なしのテスト用JWTを作成（エージェントは署名を検証しない）"""
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    return f"{encode({'alg': 'none'})}.{encode(payload)}.signature"
+
+
+def _collect_events(prompt):
+    """スタブのコンテキストでエントリーポイントを呼び出し、全イベントを取得"""
+    context = SimpleNamespace(
+        request_headers={'Authorization': f"Bearer {_make_jwt({'sub': 'test-user'})}"},
+        session_id='healthmate-test-session-' + '0' * 32
+    )
+
+    async def collect():
+        return [event async for event in agent_module.invoke({"prompt": prompt}, context)]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("prompt", ["", "   ", "\n\t "])
+def test_blank_prompt_returns_default_greeting(monkeypatch, prompt):
+    """空・空白のみのプロンプトはエージェントを起動せずデフォルトメッセージを返す"""
+    async def fail_invoke(*args, **kwargs):
+        raise AssertionError("空白のみのプロンプトでエージェントが呼び出されました")
+
+    monkeypatch.setattr(agent_module, "invoke_health_coach", fail_invoke)
+
+    events = _collect_events(prompt)
+
+    assert events == [{"event": {"contentBlockDelta": {"delta": {"text": DEFAULT_GREETING}}}}]
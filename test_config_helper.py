@@ -8,40 +8,139 @@ CloudFormationスタックから動的に設定を取得し、
 環境別設定対応:
 - HEALTHMATE_ENV環境変数に基づく環境別スタック名の自動解決
 - 環境別CloudFormationスタックからの設定取得
+
+取得した設定は ~/.cache/healthmate/ にスタック・リージョン・AWSプロファイル別にキャッシュされ、
+HEALTHMATE_CFN_CACHE_TTL（秒、デフォルト: 3600）の間は再取得しません。
+HEALTHMATE_TEST_CONFIG_NOCACHE=1 でディスクキャッシュを無効化できます。
+
+設定取得の進捗はロガー（healthmate.test_config）に出力されます。
+スクリプトのエントリーポイントで configure_logging() を呼び出すと、
+HEALTHMATE_LOG=INFO で表示されます（デフォルト: WARNING）。
 """
 
-import boto3
+import concurrent.futures
+import functools
+import hashlib
 import json
+import logging
 import os
-from botocore.exceptions import ClientError
+import sys
+import tempfile
+import time
+from functools import cached_property
+from pathlib import Path
+
+
+logger = logging.getLogger('healthmate.test_config')
+
+# CloudFormation設定のディスクキャッシュ
+CFN_CACHE_DIR = Path.home() / '.cache' / 'healthmate'
+DEFAULT_CFN_CACHE_TTL = 3600
+
+# TestConfigのCloudFormation設定取得のタイムアウト（秒）と最大試行回数
+# （応答しない呼び出しで設定取得が止まらないよう、クライアント側で時間を制限する）
+CFN_LOOKUP_CONNECT_TIMEOUT = 5
+CFN_LOOKUP_READ_TIMEOUT = 10
+CFN_LOOKUP_MAX_ATTEMPTS = 2
+
+
+# 各スタックから取得する出力キー
+REQUIRED_CORE_OUTPUTS = ('UserPoolId', 'UserPoolClientId')
+REQUIRED_HEALTHMANAGER_OUTPUTS = ('GatewayId',)
+
+# TestConfigの設定（ディスクキャッシュの検証にも使用）に必要なキー
+REQUIRED_CONFIG_KEYS = ('region', 'user_pool_id', 'client_id', 'gateway_id')
+
+
+def _extract_outputs(stack: dict, required_keys: tuple) -> dict:
+    """スタックのOutputsから必要なキーだけを取り出す（全キーが揃った時点で走査を終了）"""
+    outputs = {}
+    for output in stack.get('Outputs', []):
+        if output['OutputKey'] in required_keys:
+            outputs[output['OutputKey']] = output['OutputValue']
+            if len(outputs) == len(required_keys):
+                break
+    return outputs
+
+
+def configure_logging(default_level: str = 'WARNING'):
+    """スクリプト実行時のログ出力を設定（各スクリプトのエントリーポイントから呼び出す）
+    
+    メッセージのみを標準出力に出力し、healthmate.* ロガーのレベルを
+    HEALTHMATE_LOG 環境変数（未設定・無効な値の場合は default_level）に設定します。
+    """
+    logging.basicConfig(format='%(message)s', stream=sys.stdout)
+    healthmate_logger = logging.getLogger('healthmate')
+    try:
+        healthmate_logger.setLevel(os.environ.get('HEALTHMATE_LOG', default_level).upper())
+    except ValueError:
+        healthmate_logger.setLevel(default_level)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_boto3_session():
+    """プロセス共通のboto3セッションを取得
+    
+    boto3（botocore）のインポートは重いため、AWSクライアントが初めて必要になるまで遅延させます。
+    """
+    import boto3
+    return boto3.Session()
+
+
+@functools.lru_cache(maxsize=None)
+def get_boto3_client(service_name: str, region_name: str):
+    """サービス・リージョン別のboto3クライアントを取得（プロセス内で共有）
+    
+    サービスモデルの読み込みや認証情報・エンドポイントの解決を
+    クライアント毎に繰り返さないよう、共通セッションから作成したクライアントを再利用します。
+    """
+    return _get_boto3_session().client(service_name, region_name=region_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_cfn_lookup_client(region_name: str):
+    """TestConfigの設定取得用CloudFormationクライアントを取得
+    
+    接続・読み取りタイムアウトと再試行回数を制限し、DescribeStacks 1回にかかる時間の上限を設けます。
+    他の呼び出しには影響しないよう、get_boto3_client() とは別のクライアントを使用します。
+    """
+    from botocore.config import Config
+    config = Config(
+        connect_timeout=CFN_LOOKUP_CONNECT_TIMEOUT,
+        read_timeout=CFN_LOOKUP_READ_TIMEOUT,
+        retries={'max_attempts': CFN_LOOKUP_MAX_ATTEMPTS, 'mode': 'standard'}
+    )
+    return _get_boto3_session().client('cloudformation', region_name=region_name, config=config)
+
+
+# 環境別CloudFormationスタック名（Healthmate-Core, Healthmate-HealthManager）
+_STACK_NAMES = {
+    environment: (f'Healthmate-CoreStack-{environment}', f'Healthmate-HealthManagerStack-{environment}')
+    for environment in ('dev', 'stage', 'prod')
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_invalid_environment(environment: str):
+    """無効な環境値の警告（同じ値については一度だけ出力）"""
+    logger.warning("❌ 無効な環境値: %s\n   有効な値: dev, stage, prod\n   デフォルトのdev環境を使用します", environment)
 
 
 class TestConfig:
     """テスト用設定管理クラス"""
     
-    def __init__(self):
-        self._config = None
+    def __init__(self, use_disk_cache: bool = True):
+        self.use_disk_cache = use_disk_cache
     
     def _get_stack_names(self) -> tuple:
         """CloudFormationスタック名を取得（環境別対応）"""
         # HEALTHMATE_ENV環境変数の取得（デフォルト: dev）
         environment = os.environ.get('HEALTHMATE_ENV', 'dev')
-        
-        # 有効な環境値の検証
-        if environment not in ['dev', 'stage', 'prod']:
-            print(f"❌ 無効な環境値: {environment}")
-            print("   有効な値: dev, stage, prod")
-            print("   デフォルトのdev環境を使用します")
-            environment = 'dev'
-        
-        # 環境別サフィックスの設定
-        env_suffix = f"-{environment}"
-        
-        # 環境別スタック名の生成
-        core_stack = f'Healthmate-CoreStack{env_suffix}'
-        healthmanager_stack = f'Healthmate-HealthManagerStack{env_suffix}'
-        
-        return core_stack, healthmanager_stack
+        stack_names = _STACK_NAMES.get(environment)
+        if stack_names is None:
+            _warn_invalid_environment(environment)
+            stack_names = _STACK_NAMES['dev']
+        return stack_names
     
     def _get_region(self) -> str:
         # AWS_REGION 環境変数から取得、デフォルトは、us-west-2リージョンを使用
@@ -51,47 +150,48 @@ class TestConfig:
         """CloudFormationスタックから設定を取得"""
         try:
             core_stack, healthmanager_stack = self._get_stack_names()
-            region = self._get_region()
+            region = self.region
             
             # 環境情報を表示
             environment = os.environ.get('HEALTHMATE_ENV', 'dev')
-            print(f"CloudFormation設定取得中:")
-            print(f"  環境: {environment}")
-            print(f"  Cognito設定: {core_stack}")
-            print(f"  Gateway設定: {healthmanager_stack}")
-            print(f"  リージョン: {region}")
+            logger.info("CloudFormation設定取得中:")
+            logger.info("  環境: %s", environment)
+            logger.info("  Cognito設定: %s", core_stack)
+            logger.info("  Gateway設定: %s", healthmanager_stack)
+            logger.info("  リージョン: %s", region)
             
-            cfn = boto3.client('cloudformation', region_name=region)
+            cfn = _get_cfn_lookup_client(region)
+            
+            # 2つのスタックのDescribeStacksを並行して実行（boto3クライアントはスレッドセーフ）
+            # 待ち時間の上限は設定取得用クライアントのタイムアウト設定で制限する
+            # （result(timeout=...)ではwithを抜ける際に実行中の呼び出しの完了を待ってしまう）
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                core_future = executor.submit(cfn.describe_stacks, StackName=core_stack)
+                healthmanager_future = executor.submit(cfn.describe_stacks, StackName=healthmanager_stack)
+                core_response = core_future.result()
+                healthmanager_response = healthmanager_future.result()
             
             # Healthmate-Coreスタックから認証設定を取得
-            core_response = cfn.describe_stacks(StackName=core_stack)
             if not core_response['Stacks']:
                 raise Exception(f"CloudFormationスタック '{core_stack}' が見つかりません")
             
-            core_outputs = {}
-            for output in core_response['Stacks'][0].get('Outputs', []):
-                core_outputs[output['OutputKey']] = output['OutputValue']
+            core_outputs = _extract_outputs(core_response['Stacks'][0], REQUIRED_CORE_OUTPUTS)
             
             # Healthmate-HealthManagerスタックからGateway設定を取得
-            healthmanager_response = cfn.describe_stacks(StackName=healthmanager_stack)
             if not healthmanager_response['Stacks']:
                 raise Exception(f"CloudFormationスタック '{healthmanager_stack}' が見つかりません")
             
-            healthmanager_outputs = {}
-            for output in healthmanager_response['Stacks'][0].get('Outputs', []):
-                healthmanager_outputs[output['OutputKey']] = output['OutputValue']
+            healthmanager_outputs = _extract_outputs(healthmanager_response['Stacks'][0], REQUIRED_HEALTHMANAGER_OUTPUTS)
             
-            print(f"Healthmate-Core出力: {list(core_outputs.keys())}")
-            print(f"Healthmate-HealthManager出力: {list(healthmanager_outputs.keys())}")
+            logger.info("Healthmate-Core出力: %s", list(core_outputs))
+            logger.info("Healthmate-HealthManager出力: %s", list(healthmanager_outputs))
             
             # 必要な出力が存在するかチェック
-            required_core_outputs = ['UserPoolId', 'UserPoolClientId']
-            missing_core_outputs = [key for key in required_core_outputs if key not in core_outputs]
+            missing_core_outputs = [key for key in REQUIRED_CORE_OUTPUTS if key not in core_outputs]
             if missing_core_outputs:
                 raise Exception(f"Healthmate-Coreスタックに必要な出力が見つかりません: {missing_core_outputs}")
             
-            required_healthmanager_outputs = ['GatewayId']
-            missing_healthmanager_outputs = [key for key in required_healthmanager_outputs if key not in healthmanager_outputs]
+            missing_healthmanager_outputs = [key for key in REQUIRED_HEALTHMANAGER_OUTPUTS if key not in healthmanager_outputs]
             if missing_healthmanager_outputs:
                 raise Exception(f"Healthmate-HealthManagerスタックに必要な出力が見つかりません: {missing_healthmanager_outputs}")
             
@@ -103,34 +203,134 @@ class TestConfig:
                 'gateway_id': healthmanager_outputs['GatewayId']
             }
             
-            print("✅ CloudFormation設定取得完了")
+            logger.info("✅ CloudFormation設定取得完了")
             return config
             
         except Exception as e:
-            print(f"❌ CloudFormation設定取得エラー: {e}")
+            logger.error("❌ CloudFormation設定取得エラー: %s", e)
             raise
     
+    def _get_cache_ttl(self) -> float:
+        """ディスクキャッシュの有効期間（秒）を取得"""
+        try:
+            return float(os.environ.get('HEALTHMATE_CFN_CACHE_TTL', DEFAULT_CFN_CACHE_TTL))
+        except ValueError:
+            return DEFAULT_CFN_CACHE_TTL
+    
+    def _is_disk_cache_enabled(self) -> bool:
+        """ディスクキャッシュを使用するかどうか"""
+        return self.use_disk_cache and os.environ.get('HEALTHMATE_TEST_CONFIG_NOCACHE') != '1'
+    
+    def _get_credentials_key(self) -> str:
+        """認証情報の識別子を取得（AWSプロファイル、環境変数のアクセスキーIDから算出）
+        
+        別アカウントの設定を取り違えないよう、キャッシュを認証情報の指定方法別に分けます。
+        boto3を読み込まずに済むよう、環境変数のみから算出します。
+        """
+        profile = os.environ.get('AWS_PROFILE') or os.environ.get('AWS_DEFAULT_PROFILE') or 'default'
+        access_key_id = os.environ.get('AWS_ACCESS_KEY_ID', '')
+        return hashlib.sha256(f"{profile}\0{access_key_id}".encode('utf-8')).hexdigest()[:16]
+    
+    def _get_cache_path(self) -> Path:
+        """ディスクキャッシュのファイルパスを取得（スタック・リージョン・認証情報別）"""
+        core_stack, _ = self._get_stack_names()
+        return CFN_CACHE_DIR / f"cfn-{core_stack}-{self.region}-{self._get_credentials_key()}.json"
+    
+    def _load_cached_config(self) -> dict:
+        """有効期間内のディスクキャッシュから設定を読み込む（なければNone）"""
+        if not self._is_disk_cache_enabled():
+            return None
+        
+        cache_path = self._get_cache_path()
+        try:
+            if time.time() - cache_path.stat().st_mtime >= self._get_cache_ttl():
+                return None
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        # 必要なキーが揃っていないキャッシュ（破損・旧形式）は使用せず再取得する
+        if not isinstance(config, dict) or not all(isinstance(config.get(key), str) for key in REQUIRED_CONFIG_KEYS):
+            logger.info("CloudFormation設定キャッシュが不完全なため再取得します: %s", cache_path)
+            return None
+        
+        logger.info("CloudFormation設定をキャッシュから取得: %s", cache_path)
+        return config
+    
+    def _save_cached_config(self, config: dict):
+        """設定をディスクキャッシュに保存（一時ファイル経由でアトミックに置き換え）"""
+        if not self._is_disk_cache_enabled():
+            return
+        
+        cache_path = self._get_cache_path()
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=cache_path.parent, suffix='.tmp',
+                                             delete=False, encoding='utf-8') as f:
+                json.dump(config, f)
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            logger.warning("⚠️  CloudFormation設定キャッシュ保存エラー: %s", e)
+    
+    @cached_property
+    def region(self) -> str:
+        """AWSリージョン"""
+        return self._get_region()
+    
+    @cached_property
+    def all_config(self) -> dict:
+        """すべての設定（初回アクセス時に取得し、以降はインスタンスにキャッシュ）"""
+        config = self._load_cached_config()
+        if config is None:
+            config = self._fetch_cloudformation_config()
+            self._save_cached_config(config)
+        return config
+    
+    @cached_property
+    def user_pool_id(self) -> str:
+        """Cognito User Pool ID"""
+        return self.all_config['user_pool_id']
+    
+    @cached_property
+    def client_id(self) -> str:
+        """Cognito User Pool Client ID"""
+        return self.all_config['client_id']
+    
+    @cached_property
+    def gateway_id(self) -> str:
+        """HealthManager Gateway ID"""
+        return self.all_config['gateway_id']
+    
+    def invalidate(self):
+        """キャッシュ済みの設定を破棄（ディスクキャッシュも削除し、次回アクセス時に再取得）"""
+        try:
+            self._get_cache_path().unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️  CloudFormation設定キャッシュ削除エラー: %s", e)
+        
+        for name in ('region', 'all_config', 'user_pool_id', 'client_id', 'gateway_id'):
+            self.__dict__.pop(name, None)
+    
     def get_all_config(self) -> dict:
         """すべての設定を取得（キャッシュ付き）"""
-        if self._config is None:
-            self._config = self._fetch_cloudformation_config()
-        return self._config
+        return self.all_config
     
     def get_cognito_config(self) -> dict:
         """Cognito設定のみを取得"""
-        config = self.get_all_config()
         return {
-            'region': config['region'],
-            'user_pool_id': config['user_pool_id'],
-            'client_id': config['client_id']
+            'region': self.all_config['region'],
+            'user_pool_id': self.user_pool_id,
+            'client_id': self.client_id
         }
     
     def get_gateway_config(self) -> dict:
         """Gateway設定のみを取得"""
-        config = self.get_all_config()
         return {
-            'region': config['region'],
-            'gateway_id': config['gateway_id']
+            'region': self.all_config['region'],
+            'gateway_id': self.gateway_id
         }
 
 
@@ -140,6 +340,9 @@ test_config = TestConfig()
 
 if __name__ == "__main__":
     """設定テスト用のメイン関数（環境別対応）"""
+    # 直接実行時は取得の進捗も表示する
+    configure_logging(default_level='INFO')
+    
     try:
         print("🔧 テスト設定を確認中...")
         
@@ -161,5 +364,4 @@ if __name__ == "__main__":
         
     except Exception as e:
         print(f"\n❌ 設定取得テストエラー: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        logger.exception("設定取得テスト中に例外が発生しました")
\ No newline at end of file
@@ -5,12 +5,95 @@ CoachAI dev環境デプロイテストスクリプト
 dev環境でのAgentCoreデプロイと環境別MCP連携確認を行います。
 """
 
+import functools
 import os
+import re
+import shutil
 import sys
 import subprocess
 import time
-import json
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from test_config_helper import get_boto3_client
+
+# 一括取得で走査するスタック数の上限（超えた場合はスタック名指定の個別取得に切り替える）
+DEFAULT_STACK_SCAN_LIMIT = 500
+
+
+def _get_stack_scan_limit() -> int:
+    """一括取得で走査するスタック数の上限を取得（不正な値の場合はデフォルト値）"""
+    try:
+        return int(os.environ.get('HEALTHMATE_STACK_SCAN_LIMIT', DEFAULT_STACK_SCAN_LIMIT))
+    except ValueError:
+        return DEFAULT_STACK_SCAN_LIMIT
+
+
+STACK_SCAN_LIMIT = _get_stack_scan_limit()
+
+# 依存スタックの候補（環境サフィックスなしの基本スタックとdev環境用スタック）
+DEPENDENT_STACK_CANDIDATES = (
+    "Healthmate-CoreStack",
+    "Healthmate-HealthManagerStack",
+    "Healthmate-CoreStack-dev",
+    "Healthmate-HealthManagerStack-dev"
+)
+
+# 依存スタックとして利用可能とみなすスタックステータス
+ACTIVE_STACK_STATUSES = [
+    'CREATE_COMPLETE',
+    'UPDATE_COMPLETE',
+    'UPDATE_ROLLBACK_COMPLETE',
+    'IMPORT_COMPLETE',
+    'IMPORT_ROLLBACK_COMPLETE'
+]
+
+# get-caller-identity の出力からArnだけを取り出す（JSON全体のパースは不要）
+_ARN_PATTERN = re.compile(r'"Arn"\s*:\s*"([^"]+)"')
+
+
+def _run_cli(args: list) -> subprocess.CompletedProcess:
+    """CLIコマンドを実行（標準入力は閉じ、posix_spawnで起動できる条件で実行）
+    
+    実行ファイルを絶対パスに解決し close_fds=False とすることで、
+    fork+exec ではなく posix_spawn による軽量な起動経路が使われます。
+    """
+    executable = shutil.which(args[0]) or args[0]
+    return subprocess.run([executable, *args[1:]], capture_output=True, text=True, timeout=10,
+                          stdin=subprocess.DEVNULL, close_fds=False)
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_aws_identity():
+    """AWS CLIの認証確認（プロセス内で一度だけ実行、再確認時は cache_clear() を呼ぶ）
+
+    Returns:
+        (成功したか, 成功時はARN・失敗時はエラーメッセージ)
+    """
+    try:
+        result = _run_cli(['aws', 'sts', 'get-caller-identity'])
+        if result.returncode == 0:
+            match = _ARN_PATTERN.search(result.stdout)
+            return True, match.group(1) if match else 'Unknown'
+        return False, f"AWS認証エラー: {result.stderr}"
+    except Exception as e:
+        return False, f"AWS CLI確認エラー: {e}"
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_agentcore_available():
+    """agentcore CLIの利用可否確認（プロセス内で一度だけ実行、再確認時は cache_clear() を呼ぶ）
+
+    Returns:
+        (利用可能か, 失敗時はエラーメッセージ)
+    """
+    try:
+        result = _run_cli(['agentcore', '--help'])
+        if result.returncode == 0:
+            return True, None
+        return False, f"AgentCore CLI確認エラー: {result.stderr}"
+    except Exception as e:
+        return False, f"AgentCore CLI確認エラー: {e}"
+
 
 def check_prerequisites():
     """デプロイ前提条件の確認"""
@@ -25,101 +108,136 @@ def check_prerequisites():
         "bedrock-agentcore-runtime-policy.json"
     ]
     
+    # ディレクトリを一度だけ走査してエントリ名の集合で存在確認
+    with os.scandir('.') as entries:
+        present_files = {entry.name for entry in entries}
+    
     for file_name in required_files:
-        file_path = Path(file_name)
-        if file_path.exists():
+        if file_name in present_files:
             print(f"   ✅ {file_name} が存在します")
         else:
             print(f"   ❌ {file_name} が見つかりません")
             return False
     
     # AWS CLI の確認
-    try:
-        result = subprocess.run(['aws', 'sts', 'get-caller-identity'], 
-                              capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            identity = json.loads(result.stdout)
-            print(f"   ✅ AWS認証成功: {identity.get('Arn', 'Unknown')}")
-        else:
-            print(f"   ❌ AWS認証エラー: {result.stderr}")
-            return False
-    except Exception as e:
-        print(f"   ❌ AWS CLI確認エラー: {e}")
+    ok, arn_or_error = _cached_aws_identity()
+    if ok:
+        print(f"   ✅ AWS認証成功: {arn_or_error}")
+    else:
+        print(f"   ❌ {arn_or_error}")
         return False
     
     # agentcore CLI の確認
-    try:
-        result = subprocess.run(['agentcore', '--help'], 
-                              capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            print(f"   ✅ AgentCore CLI利用可能")
-        else:
-            print(f"   ❌ AgentCore CLI確認エラー: {result.stderr}")
-            return False
-    except Exception as e:
-        print(f"   ❌ AgentCore CLI確認エラー: {e}")
+    ok, error = _cached_agentcore_available()
+    if ok:
+        print(f"   ✅ AgentCore CLI利用可能")
+    else:
+        print(f"   ❌ {error}")
         return False
     
     print("\n✅ 全前提条件クリア")
     return True
 
 
-def check_dependent_stacks():
-    """依存するCloudFormationスタックの確認"""
-    print("\n🏗️  依存スタックの確認")
-    print("=" * 50)
+def _describe_stack_status(cfn, stack_name: str) -> str:
+    """スタックのステータスを取得（存在しない、または利用可能なステータスでない場合はNone）"""
+    # botocoreのインポートは重いため、実際にAWSを呼び出す時点まで遅延させる
+    from botocore.exceptions import ClientError
     
-    # 現在存在するスタックを確認（環境サフィックスなし）
-    base_stacks = [
-        "Healthmate-CoreStack",
-        "Healthmate-HealthManagerStack"
-    ]
+    try:
+        response = cfn.describe_stacks(StackName=stack_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ValidationError':
+            return None
+        raise
+    # ListStacksでの一括取得と同じく、利用可能なステータスのスタックのみを対象とする
+    stack_status = response['Stacks'][0]['StackStatus']
+    return stack_status if stack_status in ACTIVE_STACK_STATUSES else None
+
+
+def _scan_stack_statuses(cfn, stack_names: list) -> dict:
+    """ListStacks（利用可能なステータスで絞り込み）のページングで候補スタックのステータスを一括取得
     
-    # dev環境用スタックも確認
-    dev_stacks = [
-        "Healthmate-CoreStack-dev", 
-        "Healthmate-HealthManagerStack-dev"
-    ]
+    存在しないスタックを名前指定で問い合わせないため、ValidationErrorの往復が発生しません。
+    見つからないスタックはNoneになります。走査数がSTACK_SCAN_LIMITを超えた場合はNoneを返します。
+    """
+    wanted = set(stack_names)
+    statuses = dict.fromkeys(stack_names)
+    found = 0
+    scanned = 0
     
-    found_stacks = []
+    paginator = cfn.get_paginator('list_stacks')
+    for page in paginator.paginate(StackStatusFilter=ACTIVE_STACK_STATUSES):
+        for stack in page['StackSummaries']:
+            if stack['StackName'] in wanted:
+                statuses[stack['StackName']] = stack['StackStatus']
+                found += 1
+        
+        # 全候補が見つかった時点で残りのページは取得しない
+        if found == len(wanted):
+            break
+        
+        scanned += len(page['StackSummaries'])
+        if scanned >= STACK_SCAN_LIMIT:
+            return None
     
-    # まず基本スタックを確認
-    for stack_name in base_stacks:
-        try:
-            result = subprocess.run([
-                'aws', 'cloudformation', 'describe-stacks',
-                '--stack-name', stack_name
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                stack_info = json.loads(result.stdout)
-                stack_status = stack_info['Stacks'][0]['StackStatus']
-                print(f"   ✅ {stack_name}: {stack_status}")
-                found_stacks.append(stack_name)
-            else:
-                print(f"   ⚠️  {stack_name}: スタックが見つかりません")
-                
-        except Exception as e:
-            print(f"   ⚠️  {stack_name} 確認エラー: {e}")
+    return statuses
+
+
+def _describe_stack_statuses(cfn, stack_names: list) -> dict:
+    """スタック名指定のDescribeStacksを並行実行してステータスを取得（失敗したスタックは例外を格納）"""
+    with ThreadPoolExecutor(max_workers=len(stack_names)) as executor:
+        futures = {name: executor.submit(_describe_stack_status, cfn, name) for name in stack_names}
     
-    # dev環境スタックを確認
-    for stack_name in dev_stacks:
+    statuses = {}
+    for stack_name, future in futures.items():
         try:
-            result = subprocess.run([
-                'aws', 'cloudformation', 'describe-stacks',
-                '--stack-name', stack_name
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                stack_info = json.loads(result.stdout)
-                stack_status = stack_info['Stacks'][0]['StackStatus']
-                print(f"   ✅ {stack_name}: {stack_status}")
-                found_stacks.append(stack_name)
-            else:
-                print(f"   ⚠️  {stack_name}: スタックが見つかりません")
-                
+            statuses[stack_name] = future.result()
         except Exception as e:
-            print(f"   ⚠️  {stack_name} 確認エラー: {e}")
+            statuses[stack_name] = e
+    return statuses
+
+
+def _fetch_dependent_stack_statuses() -> tuple:
+    """依存スタック候補のステータスを取得（出力なし）
+    
+    Returns:
+        (候補スタック名のリスト, スタック名→ステータスの辞書)
+    """
+    # 1回のListStacks（ページング）で全候補スタックのステータスを取得
+    # スタック数が多いアカウントでは、スタック名指定の個別取得を並行実行する
+    cfn = get_boto3_client('cloudformation', os.environ.get('AWS_REGION', 'us-west-2'))
+    stack_names = list(DEPENDENT_STACK_CANDIDATES)
+    statuses = _scan_stack_statuses(cfn, stack_names)
+    if statuses is None:
+        statuses = _describe_stack_statuses(cfn, stack_names)
+    return stack_names, statuses
+
+
+def check_dependent_stacks(prefetched=None):
+    """依存するCloudFormationスタックの確認
+    
+    Args:
+        prefetched: _fetch_dependent_stack_statuses を先行実行しているFuture（省略時はここで取得）
+    """
+    print("\n🏗️  依存スタックの確認")
+    print("=" * 50)
+    
+    if prefetched is not None:
+        stack_names, statuses = prefetched.result()
+    else:
+        stack_names, statuses = _fetch_dependent_stack_statuses()
+    
+    found_stacks = []
+    for stack_name in stack_names:
+        stack_status = statuses[stack_name]
+        if isinstance(stack_status, Exception):
+            print(f"   ⚠️  {stack_name} 確認エラー: {stack_status}")
+        elif stack_status:
+            print(f"   ✅ {stack_name}: {stack_status}")
+            found_stacks.append(stack_name)
+        else:
+            print(f"   ⚠️  {stack_name}: 利用可能な状態のスタックが見つかりません")
     
     if len(found_stacks) >= 2:
         print(f"\n✅ 依存スタック確認完了 ({len(found_stacks)}個のスタックが利用可能)")
@@ -160,17 +278,17 @@ def simulate_deployment_config():
     
     # 環境別設定値の計算
     env = 'dev'
-    env_suffix = f"-{env}"
+    suffix = f"-{env}"  # deploy_to_aws.sh と同じく全環境で "-{環境名}" を付与
     
     expected_config = {
         'environment': env,
-        'env_suffix': env_suffix,
-        'role_name': f'Healthmate-CoachAI-AgentCore-Runtime-Role{env_suffix}',
-        'agent_name': f'healthmate_coach_ai{env_suffix}',
-        'memory_id': f'healthmate_coach_ai_mem{env_suffix}',
-        'provider_name': f'healthmanager-oauth2-provider{env_suffix}',
-        'core_stack': f'Healthmate-CoreStack{env_suffix}',
-        'hm_stack': f'Healthmate-HealthManagerStack{env_suffix}'
+        'env_suffix': suffix,
+        'role_name': f'Healthmate-CoachAI-AgentCore-Runtime-Role{suffix}',
+        'agent_name': f'healthmate_coach_ai{suffix}',
+        'memory_id': f'healthmate_coach_ai_mem{suffix}',
+        'provider_name': f'healthmanager-oauth2-provider{suffix}',
+        'core_stack': f'Healthmate-CoreStack{suffix}',
+        'hm_stack': f'Healthmate-HealthManagerStack{suffix}'
     }
     
     print("   予想される設定値:")
@@ -186,27 +304,40 @@ def check_deployment_readiness():
     print("\n📋 デプロイ準備状況の総合確認")
     print("=" * 50)
     
-    checks = [
-        ("前提条件", check_prerequisites),
-        ("依存スタック", check_dependent_stacks),
-        ("環境変数", test_environment_variables),
-        ("デプロイ設定", simulate_deployment_config)
-    ]
-    
     passed = 0
     failed = 0
     
-    for check_name, check_func in checks:
-        try:
-            if check_func():
-                print(f"   ✅ {check_name}: 成功")
-                passed += 1
-            else:
-                print(f"   ❌ {check_name}: 失敗")
+    # I/O待ちの大きいCLI確認とスタック取得は並行して先行実行し、
+    # 各確認の出力は従来どおりメインスレッドで順番に行う
+    # （os.environを変更する環境変数テストもメインスレッドで実行）
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        prerequisite_futures = [
+            executor.submit(_cached_aws_identity),
+            executor.submit(_cached_agentcore_available)
+        ]
+        stacks_future = executor.submit(_fetch_dependent_stack_statuses)
+        
+        checks = [
+            ("前提条件", check_prerequisites),
+            ("依存スタック", lambda: check_dependent_stacks(stacks_future)),
+            ("環境変数", test_environment_variables),
+            ("デプロイ設定", simulate_deployment_config)
+        ]
+        
+        # キャッシュ対象のCLI確認が二重に実行されないよう、完了を待ってから前提条件を確認
+        wait(prerequisite_futures)
+        
+        for check_name, check_func in checks:
+            try:
+                if check_func():
+                    print(f"   ✅ {check_name}: 成功")
+                    passed += 1
+                else:
+                    print(f"   ❌ {check_name}: 失敗")
+                    failed += 1
+            except Exception as e:
+                print(f"   ❌ {check_name}: エラー - {e}")
                 failed += 1
-        except Exception as e:
-            print(f"   ❌ {check_name}: エラー - {e}")
-            failed += 1
     
     print(f"\n📊 確認結果: 成功 {passed}, 失敗 {failed}")
     